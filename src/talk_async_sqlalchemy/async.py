@@ -5,10 +5,12 @@ from typing import Optional, cast
 
 import sqlalchemy
 from sqlalchemy import exc, orm, sql
-from sqlalchemy.ext.asyncio import engine
+from sqlalchemy.ext.asyncio import AsyncSession, engine
 
 from . import helpers, models
 
+_SELECT_MESSAGE = sqlalchemy.text("SELECT :message")
+
 
 async def simple_statement(message: str, *, async_engine: engine.AsyncEngine) -> str:
     """Execute a simple statement.
@@ -17,11 +19,8 @@ async def simple_statement(message: str, *, async_engine: engine.AsyncEngine) ->
     :param async_engine: The async engine to execute the statement with
     :return: The result of the simple statement.
     """
-    statement = sqlalchemy.text("SELECT :message")
     async with async_engine.connect() as conn:
-        result = await conn.execute(statement, parameters={"message": message})
-
-    return cast(str, result.scalar())
+        return cast(str, await conn.scalar(_SELECT_MESSAGE, {"message": message}))
 
 
 async def lazy_loading(*, session_maker: orm.sessionmaker) -> Optional[str]:
@@ -46,117 +45,142 @@ async def eager_loading(*, session_maker: orm.sessionmaker) -> Optional[str]:
     )
 
 
-async def unloaded_relationship(*, session_maker: orm.sessionmaker) -> str:
-    """Show that relationships are not preloaded.
+async def create_travelers_with_destination(
+    count: int, *, async_engine: engine.AsyncEngine
+) -> list[sql.Select]:
+    """Create travelers with a destination in a single transaction.
 
+    The destinations and travelers are inserted with one multi-row
+    ``INSERT`` each, instead of a flush per traveler.
+
+    :param count: The number of travelers to create
+    :param async_engine: The async engine to insert the rows with
+    :return: The selects that would fetch the created travelers
+    """
+    async with async_engine.begin() as conn:
+        destination_ids = await helpers.create_rows_async(
+            models.Country, [{"name": "Norway"}] * count, conn=conn
+        )
+        traveler_ids = await helpers.create_rows_async(
+            models.TravelerWithDestination,
+            [
+                {"name": "Sebastiaan", "age": 35, "destination_id": destination_id}
+                for destination_id in destination_ids
+            ],
+            conn=conn,
+        )
+    return [
+        sqlalchemy.select(models.TravelerWithDestination).where(
+            models.TravelerWithDestination.id == traveler_id
+        )
+        for traveler_id in traveler_ids
+    ]
+
+
+async def unloaded_relationship(
+    select_traveler: sql.Select, *, session_maker: orm.sessionmaker
+) -> str:
+    """Show that relationships are not loaded when lazy loads are disallowed.
+
+    :param select_traveler: The select to fetch the traveler
     :param session_maker: The async session maker
     :return: The ``repr`` of the ORM instance
     """
-    select_traveler = await helpers.create_orm_instance_async(
-        orm_model=models.TravelerWithDestination,
-        creation_kwargs={
-            "name": "Sebastiaan",
-            "age": 35,
-            "destination": models.Country(name="Norway"),
-        },
-        session_maker=session_maker,
-    )
-
+    raiseload_select = select_traveler.options(orm.raiseload("*"))
     async with session_maker() as session:
-        result = await session.execute(select_traveler)
-        traveler = cast(models.TravelerWithDestination, result.scalar())
+        result = await session.execute(raiseload_select)
+        traveler: models.TravelerWithDestination = result.scalar_one()
     return f"{traveler!r}"
 
 
 async def access_unloaded_relationship(
-    *, session_maker: orm.sessionmaker
+    select_traveler: sql.Select, *, session_maker: orm.sessionmaker
 ) -> str | None:
     """Demonstrate that accessing an unloaded relationship fails.
 
+    :param select_traveler: The select to fetch the traveler
     :param session_maker: The async session
     :return: The optional string showing the value of the relationship
     """
-    select_traveler = await helpers.create_orm_instance_async(
-        orm_model=models.TravelerWithDestination,
-        creation_kwargs={
-            "name": "Sebastiaan",
-            "age": 35,
-            "destination": models.Country(name="Norway"),
-        },
-        session_maker=session_maker,
-    )
-    return await _get_destination(select_traveler, session_maker=session_maker)
+    raiseload_select = select_traveler.options(orm.raiseload("*"))
+    async with session_maker() as session:
+        return await _get_destination(raiseload_select, session=session)
 
 
-async def access_loaded_relationship(*, session_maker: orm.sessionmaker) -> str | None:
+async def access_loaded_relationship(
+    select_traveler: sql.Select, *, session_maker: orm.sessionmaker
+) -> str | None:
     """Demonstrate that accessing an unloaded relationship fails.
 
+    :param select_traveler: The select to fetch the traveler
     :param session_maker: The async session
     :return: The optional string showing the value of the relationship
     """
-    select_traveler = await helpers.create_orm_instance_async(
-        orm_model=models.TravelerWithDestination,
-        creation_kwargs={
-            "name": "Sebastiaan",
-            "age": 35,
-            "destination": models.Country(name="Norway"),
-        },
-        session_maker=session_maker,
-    )
-    joinedload_select = select_traveler.options(
-        orm.joinedload(models.TravelerWithDestination.destination)
+    selectinload_select = select_traveler.options(
+        orm.selectinload(models.TravelerWithDestination.destination),
+        orm.raiseload("*"),
     )
-    return await _get_destination(joinedload_select, session_maker=session_maker)
+    async with session_maker() as session:
+        return await _get_destination(selectinload_select, session=session)
 
 
 async def _get_destination(
-    traveler_select: sql.Select, *, session_maker: orm.sessionmaker
+    traveler_select: sql.Select, *, session: AsyncSession
 ) -> str | None:
     """Try to get the destination of the selected traveler.
 
     :param traveler_select: The select to fetch the traveler
-    :param session_maker: The session maker to use
+    :param session: The session to fetch the traveler with
     :return: A string containing the destination or None
     """
-    async with session_maker() as session:
-        result = await session.execute(traveler_select)
-        traveler = cast(models.TravelerWithDestination, result.scalar())
-        print(helpers.format_divider("Engine activity after fetching ORM-instance"))
-        try:
-            result = f"The traveler is traveling to {traveler.destination.name!r}"
-        except exc.MissingGreenlet as exception:
-            print(f"Cannot access lazy attribute: {exception!r}")
-            result = None
-    return result
+    result = await session.execute(traveler_select)
+    traveler: models.TravelerWithDestination = result.scalar_one()
+    print(helpers.format_divider("Engine activity after fetching ORM-instance"))
+    try:
+        return f"The traveler is traveling to {traveler.destination.name!r}"
+    except exc.InvalidRequestError as exception:
+        print(f"Cannot access lazy attribute: {exception!r}")
+        return None
 
 
 async def main():
-    async_engine = helpers.get_engine_async(os.environ["DATABASE_URL"])
-    session_maker = helpers.get_async_sessions_maker(async_engine)
-    await helpers.execute_verbosely_async(
-        helpers.flush_database_async(async_engine=async_engine), label="flush_db"
-    )
-
-    targets = {
-        "simple": simple_statement("Hello, world!", async_engine=async_engine),
-        "lazy_loading": lazy_loading(session_maker=session_maker),
-        "eager_loading": eager_loading(session_maker=session_maker),
-        "unloaded_relationship": unloaded_relationship(session_maker=session_maker),
-        "access_unloaded_relationship": access_unloaded_relationship(
-            session_maker=session_maker
-        ),
-        "access_loaded_relationship": access_loaded_relationship(
-            session_maker=session_maker
-        ),
-    }
-
-    for label, coroutine in targets.items():
-        await helpers.execute_verbosely_async(coroutine, label=label)
-
-    await async_engine.dispose()
+    try:
+        async_engine = helpers.get_engine_async(os.environ["DATABASE_URL"])
+        await helpers.warm_pool_async(async_engine)
+        session_maker = helpers.get_async_sessions_maker(async_engine)
+        await helpers.execute_verbosely_async(
+            helpers.flush_database_async(async_engine=async_engine),
+            label="flush_db",
+            async_engine=async_engine,
+        )
+
+        select_travelers = await create_travelers_with_destination(
+            3, async_engine=async_engine
+        )
+
+        targets = {
+            "simple": simple_statement("Hello, world!", async_engine=async_engine),
+            "lazy_loading": lazy_loading(session_maker=session_maker),
+            "eager_loading": eager_loading(session_maker=session_maker),
+            "unloaded_relationship": unloaded_relationship(
+                select_travelers[0], session_maker=session_maker
+            ),
+            "access_unloaded_relationship": access_unloaded_relationship(
+                select_travelers[1], session_maker=session_maker
+            ),
+            "access_loaded_relationship": access_loaded_relationship(
+                select_travelers[2], session_maker=session_maker
+            ),
+        }
+
+        await helpers.execute_concurrently_async(targets, async_engine=async_engine)
+    finally:
+        await helpers.dispose_engines_async()
 
 
 if __name__ == "__main__":
+    # The demos are about the statements the engine emits, so echo them
+    os.environ.setdefault("SQLALCHEMY_ECHO", "1")
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
         asyncio.run(main())
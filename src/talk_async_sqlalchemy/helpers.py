@@ -1,8 +1,17 @@
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import io
+import logging
+import os
+import sys
 from collections import abc
-from typing import Any, Optional, Type, TypeVar, cast
+from typing import Any, Optional, TextIO, Type, TypeVar, cast
 
 import sqlalchemy
-from sqlalchemy import exc, orm, sql
+from sqlalchemy import event, exc, orm, pool, schema, sql
+from sqlalchemy.engine import interfaces
 from sqlalchemy.ext import asyncio as asyncio_ext
 from sqlalchemy.ext.asyncio import engine
 
@@ -11,6 +20,66 @@ from . import models
 DIVIDER_WIDTH = 80
 ReturnValue = TypeVar("ReturnValue")
 
+_schema_version = sqlalchemy.Table(
+    "_schema_version",
+    sqlalchemy.MetaData(),
+    sqlalchemy.Column("schema_hash", sqlalchemy.String(40), nullable=False),
+)
+
+# Pooled connections keep their loop alive, so the entries are only removed
+# by ``dispose_engines_async``
+_engines: dict[
+    asyncio.AbstractEventLoop,
+    dict[tuple[sqlalchemy.engine.URL, bool, int, int], engine.AsyncEngine],
+] = {}
+_session_makers: dict[
+    asyncio.AbstractEventLoop, dict[engine.AsyncEngine, orm.sessionmaker]
+] = {}
+
+# The format of the log handler SQLAlchemy installs for echo
+_ECHO_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+_format_default_divider = f"{{:=^{DIVIDER_WIDTH}}}".format
+_EMPTY_DIVIDER = _format_default_divider("")
+
+_output_buffer: contextvars.ContextVar[Optional[io.StringIO]] = contextvars.ContextVar(
+    "_output_buffer", default=None
+)
+
+
+class _TaskLocalStdout(io.TextIOBase):
+    """A stdout replacement that writes to the buffer of the current task.
+
+    Writes fall through to the original stream when the current task has
+    not set a buffer.
+    """
+
+    def __init__(self, stream: TextIO) -> None:
+        self._stream = stream
+
+    def write(self, text: str) -> int:
+        buffer = _output_buffer.get()
+        return (buffer if buffer is not None else self._stream).write(text)
+
+    def flush(self) -> None:
+        self._stream.flush()
+
+
+async def _write_async(text: str) -> None:
+    """Write text to the current task's buffer or, without one, to stdout.
+
+    Writing to stdout happens in a thread, so a slow terminal or pipe does
+    not block the event loop.
+
+    :param text: The text to write
+    :return: None
+    """
+    buffer = _output_buffer.get()
+    if buffer is not None:
+        buffer.write(text)
+    else:
+        await asyncio.to_thread(sys.stdout.write, text)
+
 
 def format_divider(label: str = "", width: int = DIVIDER_WIDTH) -> str:
     """Format a divider to a specific width with a label.
@@ -19,89 +88,404 @@ def format_divider(label: str = "", width: int = DIVIDER_WIDTH) -> str:
     :param width: The width of the divider
     :return: The formatted divider, optionally with label
     """
+    if width == DIVIDER_WIDTH:
+        return _format_default_divider(f"| {label} |") if label else _EMPTY_DIVIDER
     if label:
         label = f"| {label} |"
     return f"{label:=^{width}}"
 
 
-def get_engine_async(database_url: str, *, echo: bool = True) -> engine.AsyncEngine:
-    """Create an asynchronous SQLAlchemy engine.
+def get_engine_async(
+    database_url: str,
+    *,
+    echo: Optional[bool] = None,
+    pool_size: int = 10,
+    max_overflow: int = 10,
+) -> engine.AsyncEngine:
+    """Get an asynchronous SQLAlchemy engine.
+
+    Engines are shared per event loop: calls from the running loop with
+    the same url and settings return the same engine, so its pool stays
+    warm. Pooled connections belong to the loop that opened them, so other
+    loops get their own engines. Call ``dispose_engines_async`` before the
+    loop closes, as the engines and the loop are kept alive until then.
+    Outside of a running loop, a new engine is created for every call.
+
+    The engine will run in future mode. Echo is disabled unless the
+    ``SQLALCHEMY_ECHO`` environment variable is set to ``1``. It uses a
+    queue pool, so connections are reused instead of being opened anew
+    for every checkout.
 
-    The engine will run in future mode and have echo enabled.
+    PostgreSQL urls without an explicit driver use asyncpg. For asyncpg,
+    each connection caches up to 200 prepared statements and has JIT
+    compilation turned off, as it only adds latency to short queries.
 
     :param database_url: The database connection url
-    :param echo: If ``True``, turn on the engine's echo mode
+    :param echo: If ``True``, turn on the engine's echo mode (default: from
+        the ``SQLALCHEMY_ECHO`` environment variable)
+    :param pool_size: The number of connections to keep open in the pool
+    :param max_overflow: The number of connections allowed beyond ``pool_size``
     :return: The engine instance
     """
-    return asyncio_ext.create_async_engine(
-        database_url,
+    if echo is None:
+        echo = os.getenv("SQLALCHEMY_ECHO", "0") == "1"
+
+    url = sqlalchemy.engine.make_url(database_url)
+    if url.drivername == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+
+    try:
+        loop_engines = _engines.setdefault(asyncio.get_running_loop(), {})
+    except RuntimeError:
+        loop_engines = {}
+
+    key = (url, echo, pool_size, max_overflow)
+    if key in loop_engines:
+        return loop_engines[key]
+
+    connect_args: dict[str, Any] = {}
+    if url.get_driver_name() == "asyncpg":
+        connect_args["prepared_statement_cache_size"] = 200
+        connect_args["server_settings"] = {"jit": "off"}
+
+    async_engine = asyncio_ext.create_async_engine(
+        url,
         echo=echo,
         future=True,
+        query_cache_size=1200,
+        connect_args=connect_args,
+        # The pool does not pre-ping connections: the lazy loading demos
+        # deliberately trigger IO outside of a greenlet, which makes the ping
+        # fail during checkout and leaks the connection instead of returning it.
+        poolclass=pool.AsyncAdaptedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_recycle=1800,
     )
+    loop_engines[key] = async_engine
+    return async_engine
+
+
+async def dispose_engines_async() -> None:
+    """Dispose of the engines ``get_engine_async`` created for this loop.
+
+    This has to be called before the loop closes, as the engines and the
+    loop are kept alive until then. Subsequent calls to ``get_engine_async``
+    create new engines.
+
+    :return: None
+    """
+    loop = asyncio.get_running_loop()
+    engines = list(_engines.pop(loop, {}).values())
+    _session_makers.pop(loop, None)
+    await asyncio.gather(*(async_engine.dispose() for async_engine in engines))
+
+
+async def warm_pool_async(
+    async_engine: engine.AsyncEngine, size: Optional[int] = None
+) -> None:
+    """Open connections up front so they are ready for later checkouts.
+
+    The connections are opened concurrently and then returned to the pool.
+    If any connection fails to open, the ones that did open are returned to
+    the pool before the first error is raised.
+
+    :param async_engine: The async engine with the pool to warm
+    :param size: The number of connections to open (default: the pool size)
+    :return: None
+    """
+    if size is None:
+        size = async_engine.sync_engine.pool.size()
+
+    results = await asyncio.gather(
+        *(async_engine.connect().start() for _ in range(size)),
+        return_exceptions=True,
+    )
+    connections = [r for r in results if isinstance(r, asyncio_ext.AsyncConnection)]
+    await asyncio.gather(*(connection.close() for connection in connections))
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
 
 
 def get_async_sessions_maker(async_engine: engine.AsyncEngine) -> orm.sessionmaker:
     """Create an asynchronous session maker.
 
+    The session maker is shared per event loop, so repeated calls from the
+    running loop with the same engine return the same session maker, until
+    ``dispose_engines_async`` is called. Outside of a running loop, a new
+    session maker is created for every call.
+
     :param async_engine: The async engine to use for the session maker
     :return: The session maker
     """
-    return orm.sessionmaker(
-        async_engine,
-        expire_on_commit=False,
-        class_=asyncio_ext.AsyncSession,
+    try:
+        loop_session_makers = _session_makers.setdefault(asyncio.get_running_loop(), {})
+    except RuntimeError:
+        loop_session_makers = {}
+
+    if async_engine not in loop_session_makers:
+        loop_session_makers[async_engine] = orm.sessionmaker(
+            async_engine,
+            expire_on_commit=False,
+            class_=asyncio_ext.AsyncSession,
+        )
+    return loop_session_makers[async_engine]
+
+
+def _get_schema_hash(dialect: interfaces.Dialect) -> str:
+    """Get a hash of the DDL of the models' schema for a dialect.
+
+    :param dialect: The dialect to compile the DDL for
+    :return: The hexadecimal SHA-1 digest of the DDL
+    """
+    ddl = "".join(
+        str(schema.CreateTable(table).compile(dialect=dialect))
+        for table in models.Base.metadata.sorted_tables
     )
+    return hashlib.sha1(ddl.encode()).hexdigest()
+
+
+def _has_tables(conn: sqlalchemy.engine.Connection, tables: list[schema.Table]) -> bool:
+    """Check whether all tables exist in the database."""
+    inspector = sqlalchemy.inspect(conn)
+    return all(inspector.has_table(table.name, table.schema) for table in tables)
 
 
 async def flush_database_async(*, async_engine: engine.AsyncEngine) -> None:
-    """Recreate the database schema using an async engine.
+    """Flush the database using an async engine.
+
+    The schema is only recreated if it changed since the last flush, as
+    recorded in the ``_schema_version`` table, or if any of its tables is
+    missing. Otherwise, the existing tables are emptied instead.
 
     :param async_engine: The async engine to use to flush
     :return: None
     """
     async with async_engine.begin() as conn:
+        schema_hash = _get_schema_hash(conn.dialect)
+        await conn.run_sync(_schema_version.metadata.create_all)
+        current_hash = await conn.scalar(
+            sqlalchemy.select(_schema_version.c.schema_hash)
+        )
+
+        tables = models.Base.metadata.sorted_tables
+        if current_hash == schema_hash and await conn.run_sync(_has_tables, tables):
+            if conn.dialect.name == "postgresql":
+                preparer = conn.dialect.identifier_preparer
+                table_names = ", ".join(preparer.format_table(t) for t in tables)
+                await conn.execute(
+                    sqlalchemy.text(f"TRUNCATE {table_names} RESTART IDENTITY CASCADE")
+                )
+            else:
+                for table in reversed(tables):
+                    await conn.execute(table.delete())
+            return
+
         await conn.run_sync(models.Base.metadata.drop_all)
         await conn.run_sync(models.Base.metadata.create_all)
+        await conn.execute(_schema_version.delete())
+        await conn.execute(_schema_version.insert().values(schema_hash=schema_hash))
+
+
+@contextlib.contextmanager
+def count_statements(async_engine: engine.AsyncEngine) -> abc.Iterator[list[str]]:
+    """Collect the SQL statements the current task executes with the engine.
+
+    Statements executed by other tasks, for instance by coroutines running
+    concurrently, are not collected.
+
+    :param async_engine: The async engine to listen to
+    :return: A list that collects the executed statements
+    """
+    statements: list[str] = []
+    task = asyncio.current_task()
+
+    def _before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        if asyncio.current_task() is task:
+            statements.append(statement)
+
+    sync_engine = async_engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", _before_cursor_execute)
 
 
 async def execute_verbosely_async(
-    coroutine: abc.Coroutine[Any, Any, ReturnValue], *, label: str
+    coroutine: abc.Coroutine[Any, Any, ReturnValue],
+    *,
+    label: str,
+    async_engine: Optional[engine.AsyncEngine] = None,
 ) -> ReturnValue:
     """Execute the coroutine verbosely.
 
     :param coroutine: The coroutine to execute
     :param label: The label to give to the output
+    :param async_engine: If given, count the statements executed with it
     :return: The result of the coroutine
     """
-    print(format_divider(f"Start Execution of {label!r}"))
-    result = await coroutine
-    print(format_divider("Result"))
-    print(result if result is not None else "(no result)")
-    print(format_divider("End"), end="\n\n\n")
+    await _write_async(format_divider(f"Start Execution of {label!r}") + "\n")
+    if async_engine is None:
+        result = await coroutine
+    else:
+        with count_statements(async_engine) as statements:
+            result = await coroutine
+    output = [format_divider("Result"), result if result is not None else "(no result)"]
+    if async_engine is not None:
+        output.append(f"[{label}] sql_stmts={len(statements)}")
+    output.append(format_divider("End"))
+    await _write_async("\n".join(map(str, output)) + "\n\n\n")
     return result
 
 
+@contextlib.contextmanager
+def _redirect_echo(stream: TextIO) -> abc.Iterator[None]:
+    """Redirect the engine's echo logging to another stream.
+
+    The handler that echo installs keeps a reference to the stdout at the
+    time the first engine with echo enabled was created, so redirecting
+    stdout itself does not affect it. Instead, the echo handlers are
+    replaced by a handler that writes to the stream until the context exits.
+
+    :param stream: The stream to redirect the echo logging to
+    """
+    logger = logging.getLogger("sqlalchemy.engine.Engine")
+    echo_handlers = logger.handlers
+    if not echo_handlers:
+        yield
+        return
+
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(_ECHO_FORMAT))
+    logger.handlers = [handler]
+    try:
+        yield
+    finally:
+        logger.handlers = echo_handlers
+
+
+async def _execute_captured_async(
+    coroutine: abc.Coroutine[Any, Any, ReturnValue],
+    *,
+    label: str,
+    buffer: io.StringIO,
+    async_engine: Optional[engine.AsyncEngine] = None,
+) -> ReturnValue:
+    """Execute the coroutine verbosely, capturing its output in a buffer.
+
+    :param coroutine: The coroutine to execute
+    :param label: The label to give to the output
+    :param buffer: The buffer to capture the output in
+    :param async_engine: If given, count the statements executed with it
+    :return: The result of the coroutine
+    """
+    _output_buffer.set(buffer)
+    return await execute_verbosely_async(
+        coroutine, label=label, async_engine=async_engine
+    )
+
+
+async def execute_concurrently_async(
+    targets: dict[str, abc.Coroutine[Any, Any, Any]],
+    *,
+    async_engine: Optional[engine.AsyncEngine] = None,
+) -> dict[str, Any]:
+    """Execute the labeled coroutines concurrently and verbosely.
+
+    The output of each coroutine, including the engine's echo logging, is
+    buffered while they run and printed in the order of ``targets`` once
+    all of them have finished. If one of the coroutines fails, the others
+    are cancelled, so none of them is left holding a connection. The
+    output captured up to that point is still printed before the failure
+    is raised.
+
+    :param targets: A mapping of labels to the coroutines to execute
+    :param async_engine: If given, count the statements executed with it
+    :return: A mapping of labels to the results of the coroutines
+    """
+    buffers = {label: io.StringIO() for label in targets}
+    task_local_stdout = _TaskLocalStdout(sys.stdout)
+    try:
+        with _redirect_echo(task_local_stdout), contextlib.redirect_stdout(
+            task_local_stdout
+        ):
+            async with asyncio.TaskGroup() as task_group:
+                tasks = {
+                    label: task_group.create_task(
+                        _execute_captured_async(
+                            coroutine,
+                            label=label,
+                            buffer=buffers[label],
+                            async_engine=async_engine,
+                        )
+                    )
+                    for label, coroutine in targets.items()
+                }
+    finally:
+        output = "".join(buffer.getvalue() for buffer in buffers.values())
+        await asyncio.to_thread(sys.stdout.write, output)
+
+    return {label: task.result() for label, task in tasks.items()}
+
+
 async def create_orm_instance_async(
     orm_model: Type[models.Base],
     creation_kwargs: dict[str, Any],
     *,
-    session_maker: orm.sessionmaker,
+    session: asyncio_ext.AsyncSession,
 ) -> sql.Select:
     """Create an ORM instance and return a select that fetches it.
 
+    The instance is flushed within the session's ongoing transaction and
+    expunged afterwards, so the returned select will load a fresh instance.
+
     :param orm_model: The ORM model to use
     :param creation_kwargs: The kwargs to create the model with
-    :param session_maker: The session maker to use
+    :param session: The session to create the instance in
     :return: The select that would fetch the instance
     """
     instance = orm_model(**creation_kwargs)
-    async with session_maker() as session:
-        async with session.begin():
-            session.add(instance)
+    session.add(instance)
+    await session.flush()
+    session.expunge(instance)
 
     return sqlalchemy.select(orm_model).where(getattr(orm_model, "id") == instance.id)
 
 
+async def create_rows_async(
+    orm_model: Type[models.Base],
+    rows: list[dict[str, Any]],
+    *,
+    conn: asyncio_ext.AsyncConnection,
+) -> list[int]:
+    """Insert rows for an ORM model with a Core ``INSERT``.
+
+    This skips the ORM unit of work, so the rows can only contain column
+    values, not related instances. On dialects that support ``RETURNING``,
+    all rows are inserted with a single multi-row ``INSERT``; otherwise,
+    they are inserted one at a time.
+
+    :param orm_model: The ORM model to insert rows for
+    :param rows: The column values of the rows to insert
+    :param conn: The connection to insert the rows with
+    :return: The ids of the inserted rows, in the order of ``rows``
+    """
+    id_column = getattr(orm_model, "id")
+    if conn.dialect.full_returning:
+        insert = sqlalchemy.insert(orm_model).values(rows).returning(id_column)
+        return list((await conn.scalars(insert)).all())
+
+    ids = []
+    for row in rows:
+        result = await conn.execute(sqlalchemy.insert(orm_model).values(**row))
+        ids.append(result.inserted_primary_key[0])
+    return ids
+
+
 async def access_attribute_with_server_default(
     orm_model: Type[models.LazyTraveler] | Type[models.EagerTraveler],
     *,
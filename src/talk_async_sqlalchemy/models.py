@@ -12,10 +12,14 @@ class RepresentableMixin:
         """Return an insightful representation of a model instance."""
         cls_name = type(self).__name__
         instance_state = sqlalchemy.inspect(self)
+        # `unloaded` is computed on every access, so take a snapshot once
+        unloaded = frozenset(instance_state.unloaded)
         formatted_fields = ", ".join(
-            f"{attr.key}={attr.value!r}"
-            if attr.key not in instance_state.unloaded
-            else f"{attr.key}=<NOT_LOADED>"
+            (
+                f"{attr.key}={attr.value!r}"
+                if attr.key not in unloaded
+                else f"{attr.key}=<NOT_LOADED>"
+            )
             for attr in instance_state.attrs
         )
         return f"{cls_name}({formatted_fields})"